@@ -2,20 +2,26 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import json
+import multiprocessing
+import multiprocessing.spawn
 import os
 import re
+import shutil
+import tempfile
 
 import rig.utils.facial_rig
 import stim
 from maya import cmds
+from maya.api import OpenMaya as om2
 from pipemaya import animation
 from rig.utils import facial_rig
 
 from lfdn_td.facial import utils
+from lfdn_td.facial import weights_worker
 from lfdn_td.facial.config import ALL_CONNECTIONS
 from lfdn_td.facial.config import BLENDSHAPE_CONNECTIONS
-from lfdn_td.facial.config import DEFORMER_SUFFIX_ASSOCIATIONS
 from lfdn_td.facial.config import DEFORMERS_STACK
 from lfdn_td.facial.config import FACIAL_MODELING_HIERARCHY
 from lfdn_td.facial.config import GROUPS_HIERARCHY
@@ -24,6 +30,19 @@ from lfdn_td.facial.config import TEMPLATE_SCENES_PATH
 
 LOG = stim.get_logger(__name__)
 
+# Minimum meshes count to export weights from worker processes
+_PARALLEL_MIN_MESHES = 4
+
+_INDEX_RE = re.compile(r"\[(\d+)\]")
+_JOINT_NUMBER_RE = re.compile(r"_(\d+)_")
+
+# rename_scene patterns, matched on the leaf name like cmds.ls wildcards
+_CLUSTER_RE = re.compile(r"(?:^|\|)[^:|]*_cluster(?:_loc)?$")
+_CHEEBONE_RE = re.compile(r"(?:^|\|)[^:|]*cheebone[^:|]*$")
+_LATTICE_RE = re.compile(
+    r"(?:^|\|)[^:|]*(?:_lattice_clusterHandle_loc|__lattice_clusterHandle)$"
+)
+
 
 def base_meshes_setup(
     modeling_data=FACIAL_MODELING_HIERARCHY,
@@ -41,17 +60,14 @@ def base_meshes_setup(
     rig.utils.facial_rig.create_face_hierarchy()
 
     # Create and organise all meshes
-    created = {}
+    created = collections.defaultdict(lambda: collections.defaultdict(list))
 
     for node_data in modeling_data.values():
         node = node_data["name"]
         groups = node_data["groups"]
+        group_totals = collections.Counter(groups)
 
-        nodes = [node]
-        if node.startswith("{}"):
-            nodes = [node.format(side) for side in "LR"]
-
-        for obj in nodes:
+        for obj in utils.expand_sides(node):
             occurrences = {}
 
             if not cmds.objExists(obj):
@@ -65,7 +81,7 @@ def base_meshes_setup(
                 group_name = group_data[group]
 
                 occurrences[group] = occurrences.get(group, 0) + 1
-                if occurrences[group] > 1 or groups.count(group) > 1:
+                if occurrences[group] > 1 or group_totals[group] > 1:
                     indexed = f"{group}{occurrences[group]:02}"
                 else:
                     indexed = group
@@ -96,12 +112,11 @@ def base_meshes_setup(
                         replace=["_geo", "_mesh"],
                     )[0]
 
-                if obj not in created:
-                    created[obj] = {}
-                if group not in created[obj]:
-                    created[obj][group] = []
                 created[obj][group].append(duplicated)
 
+    # Next free target index of each blendShape
+    blendshape_counts = {}
+
     for created_value in created.values():
         # Create all blendShapes connections
         for source_group, targets_group in connection_data.items():
@@ -129,21 +144,26 @@ def base_meshes_setup(
                             )
                         blendshape = blendshape[0]
 
+                        if blendshape not in blendshape_counts:
+                            blendshape_counts[blendshape] = len(
+                                cmds.blendShape(
+                                    blendshape, q=True, target=True
+                                )
+                                or []
+                            )
+                        target_count = blendshape_counts[blendshape]
+
                         cmds.blendShape(
                             blendshape,
                             edit=True,
                             target=(
                                 target_mesh,
-                                len(
-                                    cmds.blendShape(
-                                        blendshape, q=True, target=True
-                                    )
-                                    or []
-                                ),
+                                target_count,
                                 source_mesh,
                                 1.0,
                             ),
                         )
+                        blendshape_counts[blendshape] = target_count + 1
                         cmds.setAttr(f"{blendshape}.{source_mesh}", 1.0)
 
 
@@ -153,47 +173,40 @@ def create_all_deformers(deformers_data=DEFORMERS_STACK):
     Args:
         deformers (dict): give all deformers information for the copy or creation
     """
-    for node, deformers in deformers_data.items():
-        objects = []
-        if node.startswith("{}"):
-            for side in "LR":
-                objects.append(node.format(side))
-                continue
-        else:
-            objects.append(node)
-
-        for obj in objects:
-            meshes = utils.get_children(obj) or [obj]
-            for mesh in meshes:
-                missing, raw_missing = utils.copy_deformers(
-                    target=mesh, deformer_stack=deformers.keys()
-                )
+    # Pause the DG once for every mesh, not once per copy_deformers call
+    with utils.batched_dg(undo=True), utils.undo_chunk("create_all_deformers"):
+        for node, deformers in deformers_data.items():
+            for obj in utils.expand_sides(node):
+                meshes = utils.get_children(obj) or [obj]
+                for mesh in meshes:
+                    missing, raw_missing = utils.copy_deformers(
+                        target=mesh, deformer_stack=deformers.keys()
+                    )
 
-                for key, deformer in zip(raw_missing, missing):
-                    suffix = deformer.split("_")[-1]
-                    for association in DEFORMER_SUFFIX_ASSOCIATIONS:
-                        if association["suffix"] == suffix:
-                            deformer_type = association["type"]
-                            break
-
-                    if deformer_type:
-                        if deformer_type == "skinCluster":
-                            joints = deformers[key]["joints"]
-                            use_hierarchy = deformers[key]["use_hierarchy"]
-                            envelope = deformers[key]["envelope"]
-                            utils.bind_skincluster(
-                                deformer,
-                                mesh,
-                                joints,
-                                use_hierarchy=use_hierarchy,
-                                envelope=envelope,
-                            )
-                        else:
-                            meshes = [mesh]
-                            if deformers[key] is not None:
-                                source = deformers[key]["source"]
-                                meshes = [source, mesh]
-                            utils.create_deformer(name=deformer, meshes=meshes)
+                    for key, deformer in zip(raw_missing, missing):
+                        suffix = deformer.split("_")[-1]
+                        deformer_type = utils.SUFFIX_TO_TYPE.get(suffix)
+
+                        if deformer_type:
+                            if deformer_type == "skinCluster":
+                                joints = deformers[key]["joints"]
+                                use_hierarchy = deformers[key]["use_hierarchy"]
+                                envelope = deformers[key]["envelope"]
+                                utils.bind_skincluster(
+                                    deformer,
+                                    mesh,
+                                    joints,
+                                    use_hierarchy=use_hierarchy,
+                                    envelope=envelope,
+                                )
+                            else:
+                                deformer_meshes = [mesh]
+                                if deformers[key] is not None:
+                                    source = deformers[key]["source"]
+                                    deformer_meshes = [source, mesh]
+                                utils.create_deformer(
+                                    name=deformer, meshes=deformer_meshes
+                                )
 
 
 def connect_template_scenes(
@@ -220,48 +233,47 @@ def connect_template_scenes(
             1,
         )
 
-    for template in templates:
-        LOG.info("%s template connections errors:", template.upper())
-        missings = []
-
-        for destination_raw, plugs_raw in connections_data[template].items():
-            destinations = [destination_raw]
-            if destination_raw.startswith("{}"):
-                destinations = [destination_raw.format(side) for side in "LR"]
-
-            for destination in destinations:
-                dest_prefix = destination.split("_")[0]
-
-                for src_plug, dest_attr in plugs_raw.items():
-                    src_plugs = [src_plug]
-                    if src_plug.startswith("{}") and dest_prefix in "LR":
-                        src_plugs = [src_plug.format(dest_prefix)]
-                    if src_plug.startswith("{}") and dest_prefix == "M":
-                        src_plugs = [src_plug.format(side) for side in "LR"]
-
-                    for side_src_plug in src_plugs:
-                        src_prefix = side_src_plug.split("_")[0]
-
-                        side_dest_attr = dest_attr
-                        if dest_attr.endswith("{}"):
-                            side_dest_attr = dest_attr.format(src_prefix)
-
-                        side_dest_plug = f"{destination}.{side_dest_attr}"
-                        try:
-                            cmds.connectAttr(
-                                side_src_plug,
-                                side_dest_plug,
-                                force=True,
-                            )
-                        except RuntimeError:
-                            missings.append(
-                                f"{side_src_plug} -> {side_dest_plug}"
-                            )
-        if missings:
-            for missing in missings:
-                LOG.info(missing)
-        else:
-            LOG.info("[]")
+    with utils.batched_dg():
+        for template in templates:
+            LOG.info("%s template connections errors:", template.upper())
+            missings = []
+
+            for destination_raw, plugs_raw in connections_data[
+                template
+            ].items():
+                for destination in utils.expand_sides(destination_raw):
+                    dest_prefix = destination.split("_")[0]
+
+                    for src_plug, dest_attr in plugs_raw.items():
+                        src_plugs = [src_plug]
+                        if src_plug.startswith("{}") and dest_prefix in "LR":
+                            src_plugs = [src_plug.format(dest_prefix)]
+                        if src_plug.startswith("{}") and dest_prefix == "M":
+                            src_plugs = utils.expand_sides(src_plug)
+
+                        for side_src_plug in src_plugs:
+                            src_prefix = side_src_plug.split("_")[0]
+
+                            side_dest_attr = dest_attr
+                            if dest_attr.endswith("{}"):
+                                side_dest_attr = dest_attr.format(src_prefix)
+
+                            side_dest_plug = f"{destination}.{side_dest_attr}"
+                            try:
+                                cmds.connectAttr(
+                                    side_src_plug,
+                                    side_dest_plug,
+                                    force=True,
+                                )
+                            except RuntimeError:
+                                missings.append(
+                                    f"{side_src_plug} -> {side_dest_plug}"
+                                )
+            if missings:
+                for missing in missings:
+                    LOG.info(missing)
+            else:
+                LOG.info("[]")
 
 
 def export_bcs_node(bcs_nodes, meshes=None, path=None):
@@ -281,9 +293,7 @@ def export_bcs_node(bcs_nodes, meshes=None, path=None):
     """
     new_bcs_nodes = []
     new_meshes = []
-    meshes = (
-        meshes if meshes else [[].append("") for i in range(len(bcs_nodes))]
-    )
+    meshes = meshes if meshes else [None] * len(bcs_nodes)
     if not path:
         path = os.path.join(
             PROJECT_INFO["project_directory"],
@@ -346,7 +356,8 @@ def import_template_scenes(
 
         if template == "bcs":
             bcs_nodes = cmds.ls(type="DPK_bcs")
-            [cmds.setAttr(f"{n}.freezeInput", 1) for n in bcs_nodes]
+            for node_function in utils.get_dependency_nodes(bcs_nodes):
+                node_function.findPlug("freezeInput", False).setInt(1)
 
         LOG.info(
             "\n\n   The %s template is imported from the path: %s\n\n",
@@ -359,12 +370,12 @@ def import_template_scenes(
 
 def reorder_hierarchy(template_suffix="template"):
     template_groups = cmds.ls(f"*_{template_suffix}")
+    prefixes = tuple(f"{key}_" for key in ALL_CONNECTIONS)
     for group in template_groups:
-        parent = "_".join(group.split("_")[:-1])
+        parent = group.rsplit("_", 1)[0]
+        if parent.startswith(prefixes):
+            parent = parent.split("_", 1)[1]
 
-        for key in ALL_CONNECTIONS:
-            if parent.startswith(f"{key}_"):
-                parent = "_".join(parent.split("_")[1:])
         children = utils.get_children(group)
 
         for child in children:
@@ -379,114 +390,152 @@ def reorder_hierarchy(template_suffix="template"):
     cmds.delete(template_groups)
 
 
+def _get_node_name(node):
+    """Get the current unique name of a node, as listed by cmds.ls
+
+    Args:
+        node (om2.MObject): node
+
+    Return:
+        str: partial DAG path for DAG nodes, node name otherwise
+    """
+    if node.hasFn(om2.MFn.kDagNode):
+        return om2.MFnDagNode(node).partialPathName()
+    return om2.MFnDependencyNode(node).name()
+
+
+def _rename_node(node, old, new):
+    """Replace a part of the leaf name of a node
+
+    Args:
+        node (om2.MObject): node to rename
+        old (str): part of the name to replace
+        new (str): replacement
+
+    Return:
+        str: new node name
+    """
+    name = _get_node_name(node)
+    leaf = name.rsplit("|", 1)[-1]
+    return cmds.rename(name, leaf.replace(old, new))
+
+
 def rename_scene(deformers_data=DEFORMERS_STACK):
     # Rename manually
     rename_data = {
         "M_eyelash_rig05_mesh": "M_eyelash_rig_mesh",
         "M_eyelash_rig05_mesh_skinCluster": "M_eyelash_rig_mesh_skinCluster",
     }
+
     for key, value in rename_data.items():
         if cmds.objExists(key):
             cmds.rename(key, value)
 
-    # Rename clusters
-    clusters = cmds.ls(["*_cluster", "*_cluster_loc"])
-    for cluster in clusters:
-        if cmds.objectType(cluster) == "transform":
-            cmds.rename(cluster, cluster.replace("_cluster", "_clusterHandle"))
-
-    cheebone = cmds.ls("*cheebone*")
-    for wrong in cheebone:
-        if wrong.endswith("Shape"):
-            continue
+    # Walk the scene once and bucket the candidates by leaf name, their
+    # current path is only resolved when they are renamed
+    clusters = []
+    cheebones = []
+    lattices = []
+    for node in utils.iter_dependency_nodes():
+        function = om2.MFnDependencyNode(node)
+        leaf = function.name()
+        if _CLUSTER_RE.search(leaf) and function.typeName == "transform":
+            clusters.append(node)
+        if _CHEEBONE_RE.search(leaf) and not leaf.endswith("Shape"):
+            cheebones.append(node)
+        if _LATTICE_RE.search(leaf):
+            lattices.append(node)
+
+    # Rename clusters, lattice clusters get their lattice suffix below
+    for node in clusters:
+        _rename_node(node, "_cluster", "_clusterHandle")
+
+    for node in cheebones:
         try:
-            cmds.rename(wrong, wrong.replace("cheebone", "cheekbone"))
+            _rename_node(node, "cheebone", "cheekbone")
         except:
             pass
 
     # Rename lattices
-    lattices = cmds.ls([
-        "*_lattice_clusterHandle_loc",
-        "*__lattice_clusterHandle",
-    ])
-    for lattice in lattices:
-        cmds.rename(
-            lattice,
-            lattice.replace("_clusterHandle", "_clusterHandleHandle"),
-        )
+    for node in lattices + clusters:
+        if _LATTICE_RE.search(om2.MFnDependencyNode(node).name()):
+            _rename_node(node, "_clusterHandle", "_clusterHandleHandle")
 
-    # Rename skinClusters
-    nodes = deformers_data.keys()
-    for i, node in enumerate(nodes):
-        meshes = utils.get_meshes([i])
-        for mesh in meshes:
-            deformers = deformers_data[node]
-            skincluster_name = None
-            for deformer in deformers:
-                if not deformer.endswith("_skinCluster"):
-                    continue
-                skincluster_name = deformer
-                break
+    all_meshes = utils.get_all_meshes(deformers_data)
 
-            skincluster, def_typ = utils.list_deformers(
-                mesh, types=["skinCluster"]
-            )
-            if not skincluster:
-                continue
-            if not skincluster_name:
+    # Rename skinClusters and other deformers from a single listing
+    for deformers, meshes in zip(deformers_data.values(), all_meshes):
+        skincluster_template = None
+        for deformer in deformers:
+            if not deformer.endswith("_skinCluster"):
                 continue
-            if skincluster_name.startswith("{name}"):
-                skincluster_name = skincluster_name.format(name=mesh)
-            if skincluster_name.startswith("{side}"):
-                side = mesh.split("_")[0]
-                skincluster_name = skincluster_name.format(side=side)
-            if skincluster == skincluster_name:
-                continue
-            if len(skincluster) > 1:
-                cmds.error(
-                    f"One skinCluster is expected on {mesh}", noContext=True
-                )
-
-            cmds.rename(skincluster, skincluster_name)
+            skincluster_template = deformer
+            break
 
-    # Rename other deformers
-    for i, node in enumerate(nodes):
-        meshes = utils.get_meshes([i])
         for mesh in meshes:
             actual_deformers, types = utils.list_deformers(
                 mesh, types=["cluster", "ffd", "skinCluster"]
             )
 
+            skincluster = [
+                actual
+                for actual, typ in zip(actual_deformers, types)
+                if typ == "skinCluster"
+            ]
+            if skincluster and skincluster_template:
+                skincluster_name = skincluster_template
+                if skincluster_name.startswith("{name}"):
+                    skincluster_name = skincluster_name.format(name=mesh)
+                if skincluster_name.startswith("{side}"):
+                    side = mesh.split("_")[0]
+                    skincluster_name = skincluster_name.format(side=side)
+                if len(skincluster) > 1:
+                    cmds.error(
+                        f"One skinCluster is expected on {mesh}",
+                        noContext=True,
+                    )
+                if skincluster[0] != skincluster_name:
+                    index = actual_deformers.index(skincluster[0])
+                    actual_deformers[index] = cmds.rename(
+                        skincluster[0], skincluster_name
+                    )
+
             for actual, typ in zip(actual_deformers, types):
-                for data in DEFORMER_SUFFIX_ASSOCIATIONS:
-                    suffix = actual.split("_")[-1]
-                    match_suffix = bool(suffix == data["suffix"])
-                    new_name = actual.replace(suffix, data["suffix"])
+                new_suffix = utils.TYPE_TO_SUFFIX.get(typ)
+                suffix = actual.split("_")[-1]
+                if not new_suffix or suffix == new_suffix:
+                    continue
+                new_name = actual.replace(suffix, new_suffix)
+                if actual == new_name:
+                    continue
 
-                    if data["type"] != typ:
-                        continue
-                    if match_suffix is True:
-                        continue
-                    if actual == new_name:
-                        continue
+                cmds.rename(actual, new_name)
 
-                    cmds.rename(actual, new_name)
+    return all_meshes
 
 
 def export_weights(
-    directory=None, deformers_data=DEFORMERS_STACK, export_bcs=True
+    directory=None,
+    deformers_data=DEFORMERS_STACK,
+    export_bcs=True,
+    parallel=False,
+    processes=None,
 ):
     if not directory:
         directory = utils.get_directory()
 
-    rename_scene(deformers_data)
+    all_meshes = rename_scene(deformers_data)
 
     # Export deformers and skinning weights
-    for i, node in enumerate(deformers_data.keys()):
-        meshes = utils.get_meshes([i])
-        for mesh in meshes:
-            utils.export_deformers_weights(mesh, directory)
-            utils.export_skinning_weights(mesh, directory)
+    meshes = [mesh for node_meshes in all_meshes for mesh in node_meshes]
+
+    if parallel is True and len(meshes) >= _PARALLEL_MIN_MESHES:
+        _export_weights_parallel(meshes, directory, processes=processes)
+    else:
+        with utils.query_cache():
+            for mesh in meshes:
+                utils.export_deformers_weights(mesh, directory)
+                utils.export_skinning_weights(mesh, directory)
 
     # Export bcs nodes
     if export_bcs:
@@ -495,6 +544,56 @@ def export_weights(
         cmds.delete(new_meshes)
 
 
+def _export_weights_parallel(meshes, directory, processes=None):
+    """Export meshes weights from maya.standalone worker processes
+
+    The current scene is exported to a temporary file opened once by each
+    worker, then every worker exports the weights of its meshes.
+
+    Args:
+        meshes (list): meshes to export
+        directory (str): where to export weights files
+        processes (int, optional): number of workers, default is cpu count
+    """
+    maya_location = os.environ.get("MAYA_LOCATION")
+    if not maya_location:
+        cmds.error(
+            "MAYA_LOCATION is not set, mayapy workers can't be started. "
+            "Export the weights with parallel=False.",
+            noContext=True,
+        )
+
+    temp_directory = tempfile.mkdtemp(prefix="facial_weights_")
+    scene_path = os.path.join(temp_directory, "weights_export.ma")
+    cmds.file(
+        scene_path,
+        exportAll=True,
+        preserveReferences=True,
+        type="mayaAscii",
+        force=True,
+    )
+
+    # The spawn executable is global to the session, restore it after
+    mayapy = "mayapy.exe" if os.name == "nt" else "mayapy"
+    context = multiprocessing.get_context("spawn")
+    executable = multiprocessing.spawn.get_executable()
+    context.set_executable(os.path.join(maya_location, "bin", mayapy))
+
+    try:
+        with context.Pool(
+            processes=processes,
+            initializer=weights_worker.init_worker,
+            initargs=(scene_path,),
+        ) as pool:
+            pool.starmap(
+                weights_worker.export_mesh_weights,
+                [(mesh, directory) for mesh in meshes],
+            )
+    finally:
+        context.set_executable(executable)
+        shutil.rmtree(temp_directory, ignore_errors=True)
+
+
 def import_weights(
     directory=None,
     skip_meshes=(),
@@ -503,17 +602,21 @@ def import_weights(
     if not directory:
         directory = utils.get_directory()
 
-    for i, node in enumerate(deformers_data.keys()):
-        meshes = utils.get_meshes([i])
-        for mesh in meshes:
-            if mesh in skip_meshes:
-                continue
-            utils.import_deformers_weights(mesh, directory)
-            utils.import_skinning_weights(mesh, directory)
+    with utils.batched_dg(), utils.query_cache():
+        for meshes in utils.get_all_meshes(deformers_data):
+            for mesh in meshes:
+                if mesh in skip_meshes:
+                    continue
+                utils.import_deformers_weights(mesh, directory)
+                utils.import_skinning_weights(mesh, directory)
 
 
 def export_data(
-    export_ctrl=True, export_transforms=True, export_cvs=True, directory=None
+    export_ctrl=True,
+    export_transforms=True,
+    export_cvs=True,
+    directory=None,
+    pretty=False,
 ):
     """Exports three JSON files:
     1. User-defined attributes of controllers ending in "_ctrl".
@@ -529,12 +632,24 @@ def export_data(
     transforms_export_path = os.path.join(directory, "transforms_data.json")
     cvs_export_path = os.path.join(directory, "cvs_data.json")
 
+    # List controllers and other transforms in a single scene pass,
+    # constraints are transforms so they are listed too
+    controllers = []
+    nodes = []
+    for node_object in utils.iter_dependency_nodes(om2.MFn.kTransform):
+        node = om2.MFnDagNode(node_object).partialPathName()
+        short_name = node.split("|")[-1]
+        item = (node, om2.MFnDependencyNode(node_object))
+        if short_name.endswith("_ctrl") and ":" not in short_name:
+            controllers.append(item)
+        else:
+            nodes.append(item)
+
     # Export 1:
     if export_ctrl is True:
-        controllers = cmds.ls("*_ctrl", type="transform")
         ctrl_data = {}
 
-        for ctrl in controllers:
+        for ctrl, ctrl_function in controllers:
             user_attrs = cmds.listAttr(ctrl, userDefined=True) or []
             if not user_attrs:
                 continue
@@ -542,70 +657,59 @@ def export_data(
                 continue
 
             ctrl_data[ctrl] = {
-                attr: cmds.getAttr(f"{ctrl}.{attr}")
+                attr: utils.get_plug_value(
+                    ctrl_function.findPlug(attr, False)
+                )
                 for attr in user_attrs
                 if attr != "stimUuid"
             }
 
-        with open(ctrl_export_path, "w") as f:
-            json.dump(ctrl_data, f, indent=4)
+        utils.write_json(ctrl_export_path, ctrl_data, pretty=pretty)
 
     # Export 2:
     if export_transforms is True:
-        transforms = cmds.ls(type="transform")
-        constraints = cmds.ls(
-            type=[
-                "parentConstraint",
-                "pointConstraint",
-                "orientConstraint",
-                "scaleConstraint",
-            ]
-        )
-        excluded_nodes = cmds.ls("*_ctrl", type="transform")
-        all_nodes = [
-            node
-            for node in transforms + constraints
-            if node not in excluded_nodes
-        ]
         transforms_constraints_data = {}
 
-        for node in all_nodes:
-            all_attrs = cmds.listAttr(node, keyable=True) or []
-            transforms_constraints_data[node] = {
-                attr: cmds.getAttr(f"{node}.{attr}")
-                for attr in all_attrs
-                if cmds.attributeQuery(attr, node=node, exists=True)
-                and attr != "stimUuid"
-            }
+        for node, node_function in nodes:
+            node_data = {}
+            for plug in utils.list_keyable_plugs(node_function):
+                attr = om2.MFnAttribute(plug.attribute()).name
+                if attr == "stimUuid":
+                    continue
+                node_data[attr] = utils.get_plug_value(plug)
+
+            transforms_constraints_data[node] = node_data
 
-        with open(transforms_export_path, "w") as f:
-            json.dump(transforms_constraints_data, f, indent=4)
+        utils.write_json(
+            transforms_export_path, transforms_constraints_data, pretty=pretty
+        )
 
     # Export 3:
     if export_cvs is True:
         cvs_data = {}
 
-        for ctrl in controllers:
+        for ctrl, _ in controllers:
             shapes = (
                 cmds.listRelatives(ctrl, shapes=True, type="nurbsCurve") or []
             )
             for shape in shapes:
-                cvs = cmds.ls(f"{shape}.cv[*]", flatten=True)
-                if cvs:
+                selection = om2.MSelectionList()
+                selection.add(shape)
+                curve = om2.MFnNurbsCurve(selection.getDagPath(0))
+                positions = curve.cvPositions(om2.MSpace.kObject)
+                if len(positions):
                     cvs_data[ctrl] = [
-                        cmds.xform(
-                            cv,
-                            query=True,
-                            worldSpaceDistance=True,
-                            translation=True,
-                        )
-                        for cv in cvs
+                        [
+                            om2.MDistance.internalToUI(point.x),
+                            om2.MDistance.internalToUI(point.y),
+                            om2.MDistance.internalToUI(point.z),
+                        ]
+                        for point in positions
                     ]
                 else:
                     LOG.info("No CVs found for controller: %s", ctrl)
 
-        with open(cvs_export_path, "w") as f:
-            json.dump(cvs_data, f, indent=4)
+        utils.write_json(cvs_export_path, cvs_data, pretty=pretty)
 
         LOG.info("Export data completed to: %s", directory)
 
@@ -625,51 +729,15 @@ def import_data(
         with open(ctrl_import_path) as f:
             ctrl_data = json.load(f)
 
-        for ctrl, attrs in ctrl_data.items():
-            if cmds.objExists(ctrl):
-                for attr, value in attrs.items():
-                    try:
-                        if cmds.attributeQuery(attr, node=ctrl, exists=True):
-                            is_locked = cmds.getAttr(
-                                f"{ctrl}.{attr}", lock=True
-                            )
-                            if is_locked:
-                                cmds.setAttr(f"{ctrl}.{attr}", lock=False)
-                            cmds.setAttr(f"{ctrl}.{attr}", value)
-                            if is_locked:
-                                cmds.setAttr(f"{ctrl}.{attr}", lock=True)
-                    except Exception as e:
-                        LOG.info(
-                            "Failed to set attribute %s.%s: %s", ctrl, attr, e
-                        )
-            else:
-                LOG.info("%s does not exist in the scene", ctrl)
+        _set_attributes(ctrl_data)
 
     # Import transforms and constraints attributes
     if import_transforms is True:
         with open(transforms_import_path) as f:
             transforms_constraints_data = json.load(f)
 
-        for node, attrs in transforms_constraints_data.items():
-            if cmds.objExists(node):
-                for attr, value in attrs.items():
-                    try:
-                        if cmds.attributeQuery(attr, node=node, exists=True):
-                            is_locked = cmds.getAttr(
-                                f"{node}.{attr}", lock=True
-                            )
-                            if is_locked:
-                                cmds.setAttr(f"{node}.{attr}", lock=False)
-                            cmds.setAttr(f"{node}.{attr}", value)
-                            if is_locked:
-                                cmds.setAttr(f"{node}.{attr}", lock=True)
-                    except Exception as e:
-                        LOG.info(
-                            "Failed to set attribute %s.%s: %s", node, attr, e
-                        )
-            else:
-                LOG.info("%s does not exist in the scene", node)
-                
+        _set_attributes(transforms_constraints_data)
+
     '''
     # Import CV values
     if import_cvs is True:
@@ -709,6 +777,75 @@ def import_data(
     LOG.info("Import data completed from: %s", directory)'''
 
 
+def _set_attributes(nodes_data):
+    """Set exported attributes values back on their nodes
+
+    Values are queued on a single MDGModifier, locked plugs are unlocked
+    for the whole transaction then locked back. Driven plugs are skipped,
+    if the transaction fails every value is set on its own instead.
+
+    Args:
+        nodes_data (dict): attributes values by attribute name, by node name
+    """
+    modifier = om2.MDGModifier()
+    locked_plugs = []
+    queued = []
+    with utils.batched_dg():
+        try:
+            for node, attrs in nodes_data.items():
+                # Raises for missing and ambiguous names
+                try:
+                    node_function = utils.get_dependency_nodes([node])[0]
+                except RuntimeError as e:
+                    LOG.info("Failed to set attributes of %s: %s", node, e)
+                    continue
+
+                for attr, value in attrs.items():
+                    try:
+                        plug = node_function.findPlug(attr, False)
+                    except RuntimeError:
+                        continue
+
+                    # Constraints and drivers own these plugs
+                    if plug.isDestination:
+                        LOG.info(
+                            "Failed to set attribute %s.%s: driven by %s",
+                            node,
+                            attr,
+                            plug.source().name(),
+                        )
+                        continue
+
+                    if plug.isLocked:
+                        plug.isLocked = False
+                        locked_plugs.append(plug)
+
+                    try:
+                        utils.set_plug_value(plug, value, modifier)
+                    except Exception as e:
+                        LOG.info(
+                            "Failed to set attribute %s.%s: %s", node, attr, e
+                        )
+                        continue
+                    queued.append((plug, value))
+
+            try:
+                modifier.doIt()
+            except RuntimeError as e:
+                LOG.info("Failed to set attributes at once: %s", e)
+                modifier.undoIt()
+                for plug, value in queued:
+                    try:
+                        utils.set_plug_value(plug, value)
+                    except Exception as e:
+                        LOG.info(
+                            "Failed to set attribute %s: %s", plug.name(), e
+                        )
+        finally:
+            for plug in locked_plugs:
+                plug.isLocked = True
+
+
 def update_teeth_tongue_follow_jaw(edges=None, jaw_joint="M_jaw_main_jnt"):
     # Checks
     if not edges:
@@ -718,9 +855,10 @@ def update_teeth_tongue_follow_jaw(edges=None, jaw_joint="M_jaw_main_jnt"):
             "Please select exactly 2 edges to create a rivet.", noContext=True
         )
     blendshape = "jaw_blendShape"
-    for i in range(3):
-        target = utils.rebuild_blendshape_target(blendshape, i)
-        cmds.delete(target)
+    targets = [
+        utils.rebuild_blendshape_target(blendshape, i) for i in range(3)
+    ]
+    cmds.delete(targets)
 
     # Reset controllers
     animation.reset_ctrls(cmds.ls("*_ctrl") + cmds.ls("*:*_ctrl"))
@@ -743,10 +881,7 @@ def update_teeth_tongue_follow_jaw(edges=None, jaw_joint="M_jaw_main_jnt"):
         cmds.delete(target)
 
     # Create rivet
-    for association in DEFORMER_SUFFIX_ASSOCIATIONS:
-        if association["type"] == "ffd":
-            pattern = association["suffix"]
-            break
+    pattern = utils.TYPE_TO_SUFFIX["ffd"]
 
     keys = list(DEFORMERS_STACK["M_body_compil_mesh"].keys())
     last_pattern_index = -1
@@ -772,33 +907,41 @@ def update_teeth_tongue_follow_jaw(edges=None, jaw_joint="M_jaw_main_jnt"):
             type="plusMinusAverage",
         )[0].split(".", 1)
 
-        match = re.search(r"\[(\d+)\]", pma_attr)
+        match = _INDEX_RE.search(pma_attr)
         number = int(match.group(1))
-        pma_attr_increment = pma_attr.replace(f"[{number}]", f"[{number + 1}]")
+        pma_attr_increment = _INDEX_RE.sub(
+            f"[{number + 1}]", pma_attr, count=1
+        )
         pma_tongue = cmds.createNode(
             "plusMinusAverage", name=f"tongue_jawHook{attr}_sum"
         )
 
+        attr_cap = attr.capitalize()
+
+        # Offset the plusMinusAverage by the current driver output, the
+        # whole vector is read once and set on the increment compound
+        dmx_values = cmds.getAttr(f"{dmx}.output{attr_cap}")[0]
+        increment_compound = pma_attr_increment.rsplit(".", 1)[0]
+        for pma in [pma_teeth, pma_tongue]:
+            cmds.setAttr(
+                f"{pma}.{increment_compound}",
+                *[-value for value in dmx_values],
+            )
+
         for axis in "xyz":
+            axis_upper = axis.upper()
+
             # Connect plusMinusAverage
             for pma in [pma_teeth, pma_tongue]:
                 cmds.connectAttr(
-                    f"{dmx}.output{attr.capitalize()}{axis.upper()}",
+                    f"{dmx}.output{attr_cap}{axis_upper}",
                     f"{pma}.{pma_attr[:-1]}{axis}",
                     force=True,
                 )
 
-                dmx_value = cmds.getAttr(
-                    f"{dmx}.output{attr.capitalize()}{axis.upper()}"
-                )
-                cmds.setAttr(
-                    f"{pma}.{pma_attr_increment[:-1]}{axis}",
-                    -dmx_value,
-                )
-
             cmds.connectAttr(
                 f"{pma_tongue}.output3D{axis}",
-                f"M_tongue_joint_hook.{attr}{axis.upper()}",
+                f"M_tongue_joint_hook.{attr}{axis_upper}",
             )
 
         # Reset remap
@@ -808,21 +951,35 @@ def update_teeth_tongue_follow_jaw(edges=None, jaw_joint="M_jaw_main_jnt"):
             for att in ["inputMin", "inputMax", "outputMin", "outputMax"]:
                 cmds.setAttr(f"{remap}.{att}", 0)
 
-            for i, plug in enumerate(cmds.ls(f"{remap}.value[*]")):
+            plugs = cmds.ls(f"{remap}.value[*]")
+            last = len(plugs) - 1
+            for i, plug in enumerate(plugs):
                 value = 0
-                if i == len(cmds.ls(f"{remap}.value[*]")) - 1:
+                if i == last:
                     value = 1
                 cmds.setAttr(f"{plug}.value_FloatValue", value)
 
         # Add message connections
         attr_name = "get"
         attr_string = pma_attr[:-1]
-        for node in [pma_teeth, pma_tongue]:
-            cmds.addAttr(node, longName=attr_name, dataType="string")
-            cmds.setAttr(f"{node}.{attr_name}", attr_string, type="string")
-            cmds.connectAttr(
-                f"{rivet}.message", f"{node}.{attr_name}", force=True
+        rivet_message = utils.get_plug(f"{rivet}.message")
+        pma_functions = utils.get_dependency_nodes([pma_teeth, pma_tongue])
+
+        # Attributes must exist before their plugs are edited, the modifier
+        # only runs the operations queued since its last doIt
+        modifier = om2.MDGModifier()
+        for node_function in pma_functions:
+            attribute = om2.MFnTypedAttribute().create(
+                attr_name, attr_name, om2.MFnData.kString
             )
+            modifier.addAttribute(node_function.object(), attribute)
+        modifier.doIt()
+
+        for node_function in pma_functions:
+            plug = node_function.findPlug(attr_name, False)
+            modifier.newPlugValueString(plug, attr_string)
+            utils.connect_plugs(modifier, rivet_message, plug)
+        modifier.doIt()
 
     apply_tongue_crv_delta()
 
@@ -831,46 +988,59 @@ def apply_tongue_crv_delta():
     blendshape = "jaw_blendShape"
     crv_ref = "M_tongue_high_crv"
     jaw_ctrl = "M_jaw_main_ctrl"
+    jaw_plugs = {
+        attr: utils.get_plug(f"{jaw_ctrl}.{attr}")
+        for attr in ["translateX", "translateY"]
+    }
     jaw_pos = [
-        [f"{jaw_ctrl}.translateY", -1],
-        [f"{jaw_ctrl}.translateX", 1],
-        [f"{jaw_ctrl}.translateX", -1],
+        [jaw_plugs["translateY"], -1],
+        [jaw_plugs["translateX"], 1],
+        [jaw_plugs["translateX"], -1],
     ]
     crv_neutral = "M_tongue_shape_tmp_driver"
 
-    animation.reset_ctrls([jaw_ctrl])
+    # Keep the undo queue, this runs inside update_inside_mouth_setup chunk
+    with utils.batched_dg(undo=True):
+        animation.reset_ctrls([jaw_ctrl])
+
+        for i in range(3):
+            # Only the jaw translates move between targets, zero them
+            # instead of resetting the whole controller
+            for plug in jaw_plugs.values():
+                utils.set_plug_value(plug, 0)
 
-    for i in range(3):
-        target = cmds.sculptTarget(
-            blendshape, edit=True, regenerate=True, target=i
-        )
-        if not target:
-            cmds.error(
-                f"Please delete all tongue targets curves from {blendshape}",
-                noContext=True,
+            target = cmds.sculptTarget(
+                blendshape, edit=True, regenerate=True, target=i
             )
+            if not target:
+                cmds.error(
+                    "Please delete all tongue targets curves from "
+                    f"{blendshape}",
+                    noContext=True,
+                )
 
-        target = target[0]
+            target = target[0]
 
-        tokens = target.split("_")
-        tokens.insert(-1, "tmp")
-        tmp = "_".join(tokens)
+            tokens = target.split("_")
+            tokens.insert(-1, "tmp")
+            tmp = "_".join(tokens)
 
-        cmds.setAttr(jaw_pos[i][0], jaw_pos[i][1])
+            utils.set_plug_value(*jaw_pos[i])
 
-        # Delta
-        tmp_delta = utils.duplicate_node(crv_neutral, "trash_grp", "delta")[0]
-        bs = cmds.blendShape(tmp, crv_ref, tmp_delta)[0]
-        cmds.setAttr(f"{bs}.{tmp}", 1)
-        cmds.setAttr(f"{bs}.{crv_ref}", -1)
-        cmds.delete(tmp_delta, constructionHistory=True)
+            # Delta
+            tmp_delta = utils.duplicate_node(
+                crv_neutral, "trash_grp", "delta"
+            )[0]
+            bs = cmds.blendShape(tmp, crv_ref, tmp_delta)[0]
+            utils.get_plug(f"{bs}.{tmp}").setDouble(1)
+            utils.get_plug(f"{bs}.{crv_ref}").setDouble(-1)
+            cmds.delete(tmp_delta, constructionHistory=True)
 
-        bs = cmds.blendShape(tmp_delta, target)[0]
-        cmds.setAttr(f"{bs}.{tmp_delta}", 1)
-        cmds.delete(target, constructionHistory=True)
+            bs = cmds.blendShape(tmp_delta, target)[0]
+            utils.get_plug(f"{bs}.{tmp_delta}").setDouble(1)
+            cmds.delete(target, constructionHistory=True)
 
-        cmds.delete(tmp_delta)
-        cmds.delete(target)
+            cmds.delete([tmp_delta, target])
 
         animation.reset_ctrls([jaw_ctrl])
 
@@ -884,9 +1054,10 @@ def update_rivet_edges(edges=None):
             "Please select exactly 2 edges to create a rivet.", noContext=True
         )
     blendshape = "jaw_blendShape"
-    for i in range(3):
-        target = utils.rebuild_blendshape_target(blendshape, i)
-        cmds.delete(target)
+    targets = [
+        utils.rebuild_blendshape_target(blendshape, i) for i in range(3)
+    ]
+    cmds.delete(targets)
 
     # Data
     rivet = cmds.ls("*.mouth_rivet")[0].split(".")[0]
@@ -909,15 +1080,17 @@ def update_rivet_edges(edges=None):
     for node_plug in pma:
         node, node_attr = node_plug.split(".")
         node_attr_value = cmds.getAttr(f"{node}.{node_attr}")
-        match = re.search(r"\[(\d+)\]", node_attr_value)
+        match = _INDEX_RE.search(node_attr_value)
         number = int(match.group(1))
         node_attr_edit = node_attr_value.replace(
             f"[{number}]", f"[{number + 1}]"
         )
 
-        for axis in "xyz":
-            value = cmds.getAttr(f"{node}.{node_attr_value}{axis}")
-            cmds.setAttr(f"{node}.{node_attr_edit}{axis}", -value)
+        # Read and set the whole input3D element instead of each axis
+        compound = node_attr_value.rsplit(".", 1)[0]
+        compound_edit = node_attr_edit.rsplit(".", 1)[0]
+        values = cmds.getAttr(f"{node}.{compound}")[0]
+        cmds.setAttr(f"{node}.{compound_edit}", *[-value for value in values])
 
     apply_tongue_crv_delta()
 
@@ -926,45 +1099,50 @@ def scale_tongue_ikfk():
     joints = cmds.ls("tongue_*_jnt") + cmds.ls("tongue_*_bind")
     ik_ctrls = cmds.ls("M_tongue_ik_*_ctrl")
     loc_plug = "M_move_locator.inverseMatrix"
-    joints_number = []
-    numbers = []
-
-    for jnt in joints:
-        match = re.search(r"\_(\d+)\_", jnt)
-        number = match.group(1)
-        joints_number.append(number)
-        if number in numbers:
-            continue
-        numbers.append(number)
+    # Joints indices by number, numbers keep their first occurrence order
+    joints_by_number = collections.defaultdict(list)
+    for index, jnt in enumerate(joints):
+        match = _JOINT_NUMBER_RE.search(jnt)
+        joints_by_number[match.group(1)].append(index)
+    numbers = list(joints_by_number)
 
     div = len(numbers) / len(ik_ctrls)
     round_div = round(div)
 
-    for i, ctrl in enumerate(ik_ctrls):
-        start_idx = i * round_div
-        end_idx = start_idx + round_div
-        end_idx = min(end_idx, len(numbers))
+    # Scale connections are queued and made in a single transaction
+    joint_functions = utils.get_dependency_nodes(joints)
+    modifier = om2.MDGModifier()
+
+    with utils.undo_chunk("scale_tongue_ikfk"):
+        for i, ctrl in enumerate(ik_ctrls):
+            start_idx = i * round_div
+            end_idx = start_idx + round_div
+            end_idx = min(end_idx, len(numbers))
 
-        dmx = cmds.createNode("decomposeMatrix", name=f"{ctrl}_dmx")
-        mmx = cmds.createNode("multMatrix", name=f"{ctrl}_mmx")
+            dmx = cmds.createNode("decomposeMatrix", name=f"{ctrl}_dmx")
+            mmx = cmds.createNode("multMatrix", name=f"{ctrl}_mmx")
 
-        cmds.connectAttr(f"{ctrl}.worldMatrix[0]", f"{mmx}.matrixIn[0]")
-        cmds.connectAttr(loc_plug, f"{mmx}.matrixIn[1]")
-        cmds.connectAttr(f"{mmx}.matrixSum", f"{dmx}.inputMatrix")
+            cmds.connectAttr(f"{ctrl}.worldMatrix[0]", f"{mmx}.matrixIn[0]")
+            cmds.connectAttr(loc_plug, f"{mmx}.matrixIn[1]")
+            cmds.connectAttr(f"{mmx}.matrixSum", f"{dmx}.inputMatrix")
 
-        for num in numbers[start_idx:end_idx]:
-            jnt_idxs = [
-                index
-                for index, value in enumerate(joints_number)
-                if value == num
+            dmx_function = utils.get_dependency_nodes([dmx])[0]
+            scale_plugs = [
+                dmx_function.findPlug(f"outputScale{axis}", False)
+                for axis in "XYZ"
             ]
-            for y in jnt_idxs:
-                for axis in "XYZ":
-                    cmds.connectAttr(
-                        f"{dmx}.outputScale{axis}",
-                        f"{joints[y]}.scale{axis}",
-                        force=True,
-                    )
+
+            for num in numbers[start_idx:end_idx]:
+                for y in joints_by_number[num]:
+                    joint_function = joint_functions[y]
+                    for axis, scale_plug in zip("XYZ", scale_plugs):
+                        utils.connect_plugs(
+                            modifier,
+                            scale_plug,
+                            joint_function.findPlug(f"scale{axis}", False),
+                        )
+
+        modifier.doIt()
 
 
 def add_teeth_bend():
@@ -972,7 +1150,7 @@ def add_teeth_bend():
         # Data
         misc = f"{mode}Teeth_misc_grp"
         mesh_grp = f"{mode}Teeth_geo_grp"
-        mesh = utils.get_children(mesh_grp)[-1]
+        mesh = utils.get_last_child(mesh_grp)
         name = f"{mode}_Teeth_bendX"
         bend_ref = f"{mode}Teeth_bendYHandle"
         ctrl = f"M_{mode}Teeth_main_ctrl"
@@ -1008,24 +1186,24 @@ def update_inside_mouth_setup(edges=None, jaw_joint="M_jaw_main_jnt"):
             "Please select exactly 2 edges to create a rivet.", noContext=True
         )
 
-    update_teeth_tongue_follow_jaw(edges, jaw_joint)
-    scale_tongue_ikfk()
-    add_teeth_bend()
+    with utils.undo_chunk("update_inside_mouth_setup"):
+        update_teeth_tongue_follow_jaw(edges, jaw_joint)
+        scale_tongue_ikfk()
+        add_teeth_bend()
 
 
 def clean_facial_rig(delete_move_cluster=True):
-    utils.disconnect_clusters_bpm()
-    utils.check_controllers_match()
-    facial_rig.check_modeling_match()
-
-    # Delete unwanted
-    unwanted = (
-        utils.get_children("trash_grp")
-        + [
-            "M_move_cluster",
-            "M_move_cluster_loc",
+    with utils.undo_chunk("clean_facial_rig"):
+        utils.disconnect_clusters_bpm()
+        utils.check_controllers_match()
+        facial_rig.check_modeling_match()
+
+        # Delete unwanted
+        unwanted = utils.get_children("trash_grp")
+        if delete_move_cluster is True:
+            unwanted += ["M_move_cluster", "M_move_cluster_loc"]
+        existing = [
+            obj for obj in dict.fromkeys(unwanted) if cmds.objExists(obj)
         ]
-        if delete_move_cluster is True
-        else utils.get_children("trash_grp")
-    )
-    [cmds.delete(obj) for obj in unwanted if cmds.objExists(obj)]
+        if existing:
+            cmds.delete(existing)
@@ -2,53 +2,21 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import json
 import logging
 import os
 
+import shiboken2
+from maya import OpenMayaUI
 from PySide2 import QtCore
-from PySide2 import QtGui
 from PySide2 import QtWidgets
 
 LOG = logging.getLogger(__name__)
 
 INSTANCE = None  # type: MainWindow | None
 
-STYLE = """
-    QWidget {
-        background: #242527
-    }
-    QLabel {
-        color: #3AD27D;
-        font-weight: bold;
-        font-family: "Roboto";
-        font-size: 18px;
-    }
-    QTextEdit {
-        color: white;
-        font-weight: bold;
-        font-family: "Roboto";
-        font-size: 16px;
-    }
-    QLineEdit {
-        border: 2px solid #3AD27D;
-        padding: 4px;
-        border-radius: 8px;
-        font-weight: bold;
-        font-family: "Roboto";
-        font-size: 14px;
-        color: white;
-    }
-"""
-
-HEADERS = """
-    QLabel {
-        color: white;
-        font-weight: bold;
-        font-family: "Roboto";
-        font-size: 16px;
-    }
-"""
+STYLE_PATH = os.path.join(os.path.dirname(__file__), "style.qss")
+_STYLE = None
+_MAYA_WIN = None
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -59,7 +27,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setup_win()
         self.build_ui()
 
-        self.setStyleSheet(STYLE)
+        self.setStyleSheet(get_style())
 
     def build_ui(self):
         widget = QtWidgets.QWidget(self)
@@ -75,9 +43,10 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.addWidget(self.config)
 
     def check_instance(self):
-        for each in self.parent().children():
-            if each.objectName() == self.name:
-                each.deleteLater()
+        for each in self.parent().findChildren(
+            QtWidgets.QMainWindow, self.name, QtCore.Qt.FindDirectChildrenOnly
+        ):
+            each.deleteLater()
 
     def setup_win(self):
         if self.parent():
@@ -93,8 +62,7 @@ class Config(QtWidgets.QWidget):
         self.build()
 
     def build(self):
-        main_layout  = QtWidgets.QVBoxLayout(self)
-        self.setLayout(main_layout )
+        main_layout = QtWidgets.QVBoxLayout(self)
 
         # asset
         asset_layout = QtWidgets.QVBoxLayout()
@@ -107,33 +75,17 @@ class Config(QtWidgets.QWidget):
         asset_layout.addWidget(asset_input)
 
         # config
-        config_layout = QtWidgets.QVBoxLayout(self)
-        headers_layout = QtWidgets.QHBoxLayout(self)
+        config_layout = QtWidgets.QVBoxLayout()
+        headers_layout = QtWidgets.QHBoxLayout()
 
         config_label = QtWidgets.QLabel("| CONFIG")
-        geo = QtWidgets.QLabel("GEO")
-        geo.setStyleSheet(HEADERS)
-        compil = QtWidgets.QLabel("COMP")
-        compil.setStyleSheet(HEADERS)
-        bs = QtWidgets.QLabel("BS")
-        bs.setStyleSheet(HEADERS)
-        rig = QtWidgets.QLabel("RIG")
-        rig.setStyleSheet(HEADERS)
-        tool = QtWidgets.QLabel("TOOL")
-        tool.setStyleSheet(HEADERS)
-        anim = QtWidgets.QLabel("ANIM")
-        anim.setStyleSheet(HEADERS)
-        data = QtWidgets.QLabel("DATA")
-        data.setStyleSheet(HEADERS)
-
         config_layout.addWidget(config_label)
-        headers_layout.addWidget(geo)
-        headers_layout.addWidget(compil)
-        headers_layout.addWidget(bs)
-        headers_layout.addWidget(rig)
-        headers_layout.addWidget(tool)
-        headers_layout.addWidget(anim)
-        headers_layout.addWidget(data)
+
+        # headers are styled by the role property in style.qss
+        for title in ("GEO", "COMP", "BS", "RIG", "TOOL", "ANIM", "DATA"):
+            header = QtWidgets.QLabel(title)
+            header.setProperty("role", "header")
+            headers_layout.addWidget(header)
 
         # add all layouts
         main_layout.addLayout(asset_layout)
@@ -147,10 +99,31 @@ class Header(QtWidgets.QLabel):
         super(Header, self).__init__(parent=parent)
         self.setTitle(title)
 
+
+def get_style():
+    """Read the window stylesheet, the file is only read once."""
+    global _STYLE
+
+    if _STYLE is None:
+        style_file = QtCore.QFile(STYLE_PATH)
+        style_file.open(QtCore.QFile.ReadOnly | QtCore.QFile.Text)
+        _STYLE = QtCore.QTextStream(style_file).readAll()
+        style_file.close()
+    return _STYLE
+
+
 def get_maya_window():
-    """Find Maya main window."""
-    wdg = QtWidgets.QApplication.topLevelWidgets()
-    return ([x for x in wdg if x.objectName() == "MayaWindow"] or [None])[0]
+    """Find Maya main window, the wrapper is cached while it is valid."""
+    global _MAYA_WIN
+
+    if _MAYA_WIN is None or not shiboken2.isValid(_MAYA_WIN):
+        pointer = OpenMayaUI.MQtUtil.mainWindow()
+        _MAYA_WIN = (
+            shiboken2.wrapInstance(int(pointer), QtWidgets.QWidget)
+            if pointer
+            else None
+        )
+    return _MAYA_WIN
 
 
 def show():
@@ -2,11 +2,20 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import contextlib
+import functools
 import json
 import os
 import re
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import autorig.deformers
+import maya.api.OpenMaya as om2
 import maya.cmds as cmds
 import maya.mel as mel
 import stim
@@ -25,6 +34,98 @@ from lfdn_td.facial.config import TEMPLATE_SCENES_PATH
 
 LOG = stim.get_logger(__name__)
 
+# Scene queries cache, only set inside query_cache()
+_QUERY_CACHE = None
+
+_SKIP_CONTROLLERS = frozenset(SKIP_CONTROLLERS)
+
+# Deformer suffixes lookups, shared with build
+SUFFIX_TO_TYPE = {
+    data["suffix"]: data["type"] for data in DEFORMER_SUFFIX_ASSOCIATIONS
+}
+TYPE_TO_SUFFIX = {
+    data["type"]: data["suffix"] for data in DEFORMER_SUFFIX_ASSOCIATIONS
+}
+
+# Name parts up to the first one containing "ctrl"
+_CTRL_NAME_RE = re.compile(r"^(?:[^_]*_)*?[^_]*ctrl[^_]*")
+
+
+@contextlib.contextmanager
+def batched_dg(undo=False):
+    """Suspend viewport refresh, DG evaluation and undo queue
+
+    Use it around bulk connectAttr / setAttr loops.
+    Every state is restored on exit, even if an exception is raised.
+
+    Args:
+        undo (bool, optional): keep the undo queue enabled
+    """
+    refresh_suspended = cmds.refresh(query=True, suspend=True)
+    evaluation_mode = cmds.evaluationManager(query=True, mode=True)[0]
+    undo_state = cmds.undoInfo(query=True, stateWithoutFlush=True)
+
+    cmds.refresh(suspend=True)
+    cmds.evaluationManager(mode="off")
+    if undo is False:
+        cmds.undoInfo(stateWithoutFlush=False)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(stateWithoutFlush=undo_state)
+        cmds.evaluationManager(mode=evaluation_mode)
+        cmds.refresh(suspend=refresh_suspended)
+
+
+@contextlib.contextmanager
+def query_cache():
+    """Cache list_deformers scene queries inside the context
+
+    Only use it around code which does not add, remove or rename
+    deformers. The cache is dropped on exit, nested contexts share it.
+    """
+    global _QUERY_CACHE
+
+    if _QUERY_CACHE is not None:
+        yield
+        return
+
+    _QUERY_CACHE = {}
+    try:
+        yield
+    finally:
+        _QUERY_CACHE = None
+
+
+@contextlib.contextmanager
+def undo_chunk(name):
+    """Group every command run in the context in a single undo entry
+
+    Args:
+        name (str): undo chunk name
+    """
+    cmds.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+
+@contextlib.contextmanager
+def preserve_selection():
+    """Restore the user selection on exit
+
+    Use it around tools which only work on the selection.
+    """
+    selection = cmds.ls(selection=True)
+    try:
+        yield
+    finally:
+        if selection:
+            cmds.select(selection, replace=True)
+        else:
+            cmds.select(clear=True)
+
 
 def duplicate_node(node, parent=None, complement_name="", replace=None):
     """Duplicate node
@@ -58,6 +159,37 @@ def duplicate_node(node, parent=None, complement_name="", replace=None):
     return nodes
 
 
+def copy_mesh(mesh, name=None):
+    """Copy the deformed geometry of a mesh to a new world mesh
+
+    Unlike cmds.duplicate, the history, children and extra shapes of the
+    source are not copied.
+
+    Args:
+        mesh (str): mesh transform to copy
+        name (str, optional): new mesh name, "#" is replaced by a number
+                              if not provided, use the source name
+
+    Return:
+        str: new mesh transform
+    """
+    selection = om2.MSelectionList()
+    selection.add(mesh)
+    dag_path = selection.getDagPath(0)
+    dag_path.extendToShape()
+
+    transform = om2.MFnMesh().copy(dag_path.node())
+    new_mesh = om2.MFnDagNode(transform).partialPathName()
+    cmds.sets(new_mesh, edit=True, forceElement="initialShadingGroup")
+    cmds.xform(
+        new_mesh,
+        worldSpace=True,
+        matrix=cmds.xform(mesh, query=True, worldSpace=True, matrix=True),
+    )
+
+    return cmds.rename(new_mesh, name or f"{mesh}#")
+
+
 def list_deformers(mesh, types=("blendShape",)):
     """List deformers from a mesh
 
@@ -70,25 +202,276 @@ def list_deformers(mesh, types=("blendShape",)):
             list of direct deformers,
             list of their respective types.
     """
+    key = ("deformers", mesh, tuple(types))
+    if _QUERY_CACHE is not None and key in _QUERY_CACHE:
+        deformers, deformers_types = _QUERY_CACHE[key]
+        return list(deformers), list(deformers_types)
+
     deformers = []
     deformers_types = []
 
-    relatives = cmds.listRelatives(mesh, shapes=True, fullPath=True)
-    shape_node = relatives[0] if relatives else None
-    if shape_node:
-        history = cmds.listHistory(shape_node, pruneDagObjects=True) or []
+    history = _get_mesh_history(mesh)
+    if history:
+        # One ls per type, history order is kept
+        typed_nodes = [
+            (typ, set(cmds.ls(history, type=typ) or [])) for typ in types
+        ]
         for deformer in history:
-            for typ in types:
-                deformer_filtered = cmds.ls(deformer, type=typ) or None
-
-                if deformer_filtered:
-                    deformers.append(deformer_filtered[0])
+            for typ, nodes in typed_nodes:
+                if deformer in nodes:
+                    deformers.append(deformer)
                     deformers_types.append(typ)
-                    continue
+
+    if _QUERY_CACHE is not None:
+        _QUERY_CACHE[key] = (list(deformers), list(deformers_types))
 
     return deformers, deformers_types
 
 
+def _get_mesh_history(mesh):
+    """Get the history of a mesh shape, cached inside query_cache()
+
+    Args:
+        mesh (str): mesh transform
+
+    Return:
+        list: history nodes, DAG objects are pruned
+    """
+    key = ("history", mesh)
+    if _QUERY_CACHE is not None and key in _QUERY_CACHE:
+        return _QUERY_CACHE[key]
+
+    history = []
+    relatives = cmds.listRelatives(mesh, shapes=True, fullPath=True)
+    if relatives:
+        history = cmds.listHistory(relatives[0], pruneDagObjects=True) or []
+
+    if _QUERY_CACHE is not None:
+        _QUERY_CACHE[key] = history
+    return history
+
+
+def get_dependency_nodes(nodes):
+    """Get dependency node function sets from a list of node names
+
+    Args:
+        nodes (list): unique node names, resolved in one selection list
+
+    Return:
+        list: om2.MFnDependencyNode of each node
+    """
+    selection = om2.MSelectionList()
+    for node in nodes:
+        selection.add(node)
+
+    node_functions = []
+    iterator = om2.MItSelectionList(selection)
+    while not iterator.isDone():
+        node_functions.append(om2.MFnDependencyNode(iterator.getDependNode()))
+        iterator.next()
+
+    return node_functions
+
+
+def get_plug(name):
+    """Get a plug from its name
+
+    Args:
+        name (str): plug name, as "node.attribute"
+
+    Return:
+        om2.MPlug: the plug
+    """
+    selection = om2.MSelectionList()
+    selection.add(name)
+    return selection.getPlug(0)
+
+
+def connect_plugs(modifier, source, destination):
+    """Queue a connection on a modifier, as cmds.connectAttr with force
+
+    Args:
+        modifier (om2.MDGModifier): modifier to queue the edits on
+        source (om2.MPlug): source plug
+        destination (om2.MPlug): destination plug, its input is replaced
+    """
+    current = destination.source()
+    if not current.isNull:
+        if current == source:
+            return
+        modifier.disconnect(current, destination)
+    modifier.connect(source, destination)
+
+
+def iter_dependency_nodes(filter_type=om2.MFn.kInvalid):
+    """Iterate scene nodes without listing their names
+
+    Args:
+        filter_type (int, optional): om2.MFn type, derived types are included
+
+    Yield:
+        om2.MObject: scene node
+    """
+    iterator = om2.MItDependencyNodes(filter_type)
+    while not iterator.isDone():
+        yield iterator.thisNode()
+        iterator.next()
+
+
+def list_keyable_plugs(node_function):
+    """List keyable plugs of a node, as cmds.listAttr(keyable=True)
+
+    Compound parents and attributes living inside an array are skipped,
+    they can not be queried by their short attribute name.
+
+    Args:
+        node_function (om2.MFnDependencyNode): node to list plugs from
+
+    Return:
+        list: keyable om2.MPlug
+    """
+    plugs = []
+    for i in range(node_function.attributeCount()):
+        attribute = node_function.attribute(i)
+        attribute_function = om2.MFnAttribute(attribute)
+        if not attribute_function.keyable:
+            continue
+        if attribute.hasFn(om2.MFn.kCompoundAttribute):
+            continue
+
+        in_array = False
+        while not in_array:
+            in_array = attribute_function.array
+            if attribute_function.parent.isNull():
+                break
+            attribute_function = om2.MFnAttribute(attribute_function.parent)
+        if in_array:
+            continue
+
+        plugs.append(node_function.findPlug(attribute, False))
+
+    return plugs
+
+
+def get_plug_value(plug):
+    """Get the value of a plug, as cmds.getAttr
+
+    Args:
+        plug (om2.MPlug): plug to query
+
+    Return:
+        plug value, distances and angles are given in UI units
+    """
+    attribute = plug.attribute()
+    api_type = attribute.apiType()
+
+    if api_type == om2.MFn.kNumericAttribute:
+        numeric_type = om2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om2.MFnNumericData.kBoolean:
+            return plug.asBool()
+        if numeric_type in (
+            om2.MFnNumericData.kByte,
+            om2.MFnNumericData.kChar,
+            om2.MFnNumericData.kShort,
+            om2.MFnNumericData.kInt,
+        ):
+            return plug.asInt()
+        if numeric_type in (
+            om2.MFnNumericData.kFloat,
+            om2.MFnNumericData.kDouble,
+        ):
+            return plug.asDouble()
+    elif api_type in (
+        om2.MFn.kDoubleLinearAttribute,
+        om2.MFn.kFloatLinearAttribute,
+    ):
+        return plug.asMDistance().asUnits(om2.MDistance.uiUnit())
+    elif api_type in (
+        om2.MFn.kDoubleAngleAttribute,
+        om2.MFn.kFloatAngleAttribute,
+    ):
+        return plug.asMAngle().asUnits(om2.MAngle.uiUnit())
+    elif api_type == om2.MFn.kEnumAttribute:
+        return plug.asInt()
+    elif api_type == om2.MFn.kTypedAttribute:
+        typed_attribute = om2.MFnTypedAttribute(attribute)
+        if typed_attribute.attrType() == om2.MFnData.kString:
+            return plug.asString()
+
+    return cmds.getAttr(plug.name())
+
+
+def set_plug_value(plug, value, modifier=None):
+    """Set the value of a plug, as cmds.setAttr
+
+    A locked plug is unlocked for the edit then locked back. When a
+    modifier is given the edit is queued on it instead, the caller unlocks
+    the plug and calls modifier.doIt().
+
+    Args:
+        plug (om2.MPlug): plug to edit
+        value: new value, distances and angles are given in UI units
+        modifier (om2.MDGModifier, optional): queue the edit on this modifier
+    """
+    attribute = plug.attribute()
+    api_type = attribute.apiType()
+
+    # Find the typed setter, None falls back to cmds.setAttr
+    kind = None
+    if api_type == om2.MFn.kNumericAttribute:
+        numeric_type = om2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om2.MFnNumericData.kBoolean:
+            kind, value = "Bool", bool(value)
+        elif numeric_type in (
+            om2.MFnNumericData.kByte,
+            om2.MFnNumericData.kChar,
+            om2.MFnNumericData.kShort,
+            om2.MFnNumericData.kInt,
+        ):
+            kind, value = "Int", int(value)
+        elif numeric_type in (
+            om2.MFnNumericData.kFloat,
+            om2.MFnNumericData.kDouble,
+        ):
+            kind, value = "Double", float(value)
+    elif api_type in (
+        om2.MFn.kDoubleLinearAttribute,
+        om2.MFn.kFloatLinearAttribute,
+    ):
+        kind = "MDistance"
+        value = om2.MDistance(value, om2.MDistance.uiUnit())
+    elif api_type in (
+        om2.MFn.kDoubleAngleAttribute,
+        om2.MFn.kFloatAngleAttribute,
+    ):
+        kind, value = "MAngle", om2.MAngle(value, om2.MAngle.uiUnit())
+    elif api_type == om2.MFn.kEnumAttribute:
+        kind, value = "Int", int(value)
+    elif (
+        api_type == om2.MFn.kTypedAttribute
+        and om2.MFnTypedAttribute(attribute).attrType()
+        == om2.MFnData.kString
+    ):
+        kind = "String"
+
+    if modifier is not None and kind is not None:
+        getattr(modifier, f"newPlugValue{kind}")(plug, value)
+        return
+
+    is_locked = plug.isLocked and modifier is None
+    if is_locked:
+        plug.isLocked = False
+
+    try:
+        if kind is None:
+            cmds.setAttr(plug.name(), value)
+        else:
+            getattr(plug, f"set{kind}")(value)
+    finally:
+        if is_locked:
+            plug.isLocked = True
+
+
 def get_children(node):
     """Get all child transforms of a node
 
@@ -98,15 +481,27 @@ def get_children(node):
     Return:
         list: all founded childs
     """
-    childs = []
+    return cmds.listRelatives(node, children=True, type="transform") or []
 
-    childrens = cmds.listRelatives(node, children=True) or []
-    for child in childrens:
-        if "Shape" not in child:
-            childs.append(child)
-            continue
 
-    return childs
+def get_last_child(node):
+    """Get the last child transform of a node, as get_children(node)[-1]
+
+    Args:
+        node (str): node where to find the child
+
+    Return:
+        str: last child, None if the node has no child transform
+    """
+    selection = om2.MSelectionList()
+    selection.add(node)
+    dag_function = om2.MFnDagNode(selection.getDagPath(0))
+    for index in reversed(range(dag_function.childCount())):
+        child = dag_function.child(index)
+        if child.hasFn(om2.MFn.kTransform):
+            return om2.MFnDagNode(child).partialPathName()
+
+    return None
 
 
 def copy_deformers(
@@ -132,26 +527,24 @@ def copy_deformers(
     if not deformer_stack:
         deformer_stack, deformer_types = list_deformers(source, types=types)
 
-    for deformer in reversed(deformer_stack):
-        deformers = []
-        if deformer.startswith("{}"):
-            for side in "LR":
-                deformers.append(deformer.format(side))
-                continue
-        elif deformer.startswith("{name}"):
-            deformers.append(deformer.format(name=target))
-        elif deformer.startswith("{side}"):
-            side_prefix = target.split("_")[0]
-            deformers.append(deformer.format(side=side_prefix))
-        else:
-            deformers.append(deformer)
+    # Resolve every deformer name first to check them in a single ls
+    side_prefix = target.split("_")[0]
+    resolved = [
+        (deformer, defo)
+        for deformer in reversed(deformer_stack)
+        for defo in _get_deformer_formatter(deformer)(target, side_prefix)
+    ]
 
-        for defo in deformers:
-            if cmds.objExists(defo):
-                cmds.deformer(defo, edit=True, geometry=target)
-            else:
-                missing.append(defo)
-                raw_missing.append(deformer)
+    if not resolved:
+        return missing, raw_missing
+    existing = set(cmds.ls([defo for _, defo in resolved]) or [])
+
+    for deformer, defo in resolved:
+        if defo in existing:
+            cmds.deformer(defo, edit=True, geometry=target)
+        else:
+            missing.append(defo)
+            raw_missing.append(deformer)
 
     return missing, raw_missing
 
@@ -176,11 +569,13 @@ def create_deformer(
         list: result command of the deformer creation
     """
     if not deformer_type:
-        suffix = name.split("_")[-1]
-        for association in association_map:
-            if association["suffix"] == suffix:
-                deformer_type = association["type"]
-                break
+        suffix_to_type = SUFFIX_TO_TYPE
+        if association_map is not DEFORMER_SUFFIX_ASSOCIATIONS:
+            suffix_to_type = {
+                data["suffix"]: data["type"]
+                for data in reversed(association_map)
+            }
+        deformer_type = suffix_to_type.get(name.split("_")[-1])
 
     if deformer_type:
         if deformer_type == "cluster":
@@ -240,8 +635,9 @@ def transfer_bcs_node(bcs_node, mesh=None, suffix="transfer"):
         cube_name = f"{bcs_node_name}_geo"
         mesh = cmds.polyCube(name=cube_name, constructionHistory=False)[0]
 
-    cmds.select(bcs_node, mesh)
-    new_bcs = mel.eval("DPK_bcs_transfer 0;")
+    with preserve_selection():
+        cmds.select(bcs_node, mesh, replace=True)
+        new_bcs = mel.eval("DPK_bcs_transfer 0;")
     new_bcs = cmds.rename(new_bcs, bcs_node_name)
 
     return mesh, new_bcs
@@ -341,8 +737,9 @@ def create_shrinkwrap(mesh, target, name, **kwargs):
 
 
 def export_scene(objects, path, file_type):
-    cmds.select(objects)
-    cmds.file(path, exportSelected=True, type=file_type, force=True)
+    with preserve_selection():
+        cmds.select(objects, replace=True)
+        cmds.file(path, exportSelected=True, type=file_type, force=True)
 
 
 def import_scene(path, label=""):
@@ -370,19 +767,49 @@ def get_template_data(template_type="joints"):
     selected_nodes = get_selection()
     all_connections_data = {template_type: {}}
 
+    # Keep the first node of each side template
+    raw_nodes = {}
     for node in selected_nodes:
         raw_node = node
         for side in "LR":
             if node.startswith(side):
                 node = "{}" + node[1:]
                 continue
-        if node in all_connections_data[template_type]:
+        if node in raw_nodes:
             continue
+        raw_nodes[node] = raw_node
         all_connections_data[template_type][node] = {}
 
+    # Query every input connection in one call, grouped by node
+    plugs = []
+    if raw_nodes:
         plugs = (
             cmds.listConnections(
-                raw_node,
+                list(raw_nodes.values()),
+                source=True,
+                destination=False,
+                connections=True,
+                plugs=True,
+            )
+            or []
+        )
+    node_plugs = collections.defaultdict(list)
+    for dest, input_plug in zip(plugs[::2], plugs[1::2]):
+        node_plugs[dest.split(".", 1)[0]].append((input_plug, dest))
+
+    # Resolve unit conversions inputs in one call too
+    conversions = list(
+        dict.fromkeys(
+            input_plug.split(".")[0]
+            for input_plug in plugs[1::2]
+            if "unitConversion" in input_plug
+        )
+    )
+    conversion_inputs = {}
+    if conversions:
+        conversion_plugs = (
+            cmds.listConnections(
+                conversions,
                 source=True,
                 destination=False,
                 connections=True,
@@ -390,17 +817,17 @@ def get_template_data(template_type="joints"):
             )
             or []
         )
-        dest_plugs = plugs[::2]
-        input_plugs = plugs[1::2]
+        for conversion_plug, input_plug in zip(
+            conversion_plugs[::2], conversion_plugs[1::2]
+        ):
+            conversion_inputs.setdefault(
+                conversion_plug.split(".")[0], input_plug
+            )
 
-        for input_plug, dest in zip(input_plugs, dest_plugs):
+    for node, raw_node in raw_nodes.items():
+        for input_plug, dest in node_plugs[raw_node]:
             if "unitConversion" in input_plug:
-                input_plug = cmds.listConnections(
-                    input_plug.split(".")[0],
-                    source=True,
-                    destination=False,
-                    plugs=True,
-                )[0]
+                input_plug = conversion_inputs[input_plug.split(".")[0]]
             dest = dest.split(".")[-1]
 
             for side in "LR":
@@ -421,33 +848,78 @@ def get_template_data(template_type="joints"):
     return all_connections_data
 
 
+@functools.lru_cache(maxsize=None)
+def expand_sides(template):
+    """Expand a side template to its left and right names
+
+    Args:
+        template (str): name formatted with each side if it starts with "{}"
+
+    Return:
+        tuple: expanded names, or the template alone if it has no side
+    """
+    if template.startswith("{}"):
+        return tuple(template.format(side) for side in "LR")
+    return (template,)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_deformer_formatter(template):
+    """Get the function resolving a deformer stack name for a target mesh
+
+    Args:
+        template (str): deformer name, may start with "{}", "{name}" or
+            "{side}"
+
+    Return:
+        callable: takes the target mesh and its side prefix, returns a
+            tuple of deformer names
+    """
+    if template.startswith("{}"):
+        names = expand_sides(template)
+        return lambda target, side: names
+    if template.startswith("{name}"):
+        return lambda target, side: (template.format(name=target),)
+    if template.startswith("{side}"):
+        return lambda target, side: (template.format(side=side),)
+    names = (template,)
+    return lambda target, side: names
+
+
 def get_meshes(deformer_stack_keys=None):
-    objects = [list(DEFORMERS_STACK)[i] for i in deformer_stack_keys]
+    keys = list(DEFORMERS_STACK)
+    candidates = [
+        node for i in deformer_stack_keys for node in expand_sides(keys[i])
+    ]
+    present = set(cmds.ls(candidates) or []) if candidates else set()
+
     meshes = []
-    for obj in objects:
-        side_obj = [obj]
-        if obj.startswith("{}"):
-            side_obj = [obj.format(side) for side in "LR"]
-
-        for node in side_obj:
-            if not cmds.objExists(node):
-                if node != "M_eyelash_rig_mesh":
-                    LOG.info("%s does not exist and he is skipped", node)
-                    continue
-                node = "M_eyelash_rig05_mesh"
-
-            children = get_children(node) or [node]
-            for child in children:
-                if child.startswith("{}"):
-                    for side in "LR":
-                        meshes.append(child.format(side))
-                        continue
-                else:
-                    meshes.append(child)
+    for node in candidates:
+        if node not in present:
+            if node != "M_eyelash_rig_mesh":
+                LOG.info("%s does not exist and he is skipped", node)
+                continue
+            node = "M_eyelash_rig05_mesh"
+
+        children = get_children(node) or [node]
+        for child in children:
+            meshes.extend(expand_sides(child))
 
     return meshes
 
 
+def get_all_meshes(deformers_data=DEFORMERS_STACK):
+    """Get meshes of every deformers stack key
+
+    Args:
+        deformers_data (dict): deformers stack
+
+    Return:
+        list: one list of meshes per deformers stack key
+    """
+    return [get_meshes([i]) for i in range(len(deformers_data))]
+
+
 def get_directory(data=PROJECT_INFO):
     asset_path = os.path.join(data["project_directory"], data["asset"])
     if not os.path.exists(asset_path):
@@ -462,15 +934,76 @@ def get_directory(data=PROJECT_INFO):
     return path
 
 
+def write_json(path, data, pretty=False):
+    """Write data to a json file
+
+    Args:
+        path (str): json file path
+        data: serializable data
+        pretty (bool, optional): indent the file, compact output is faster
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty is True:
+            option |= orjson.OPT_INDENT_2
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=option))
+        return
+
+    with open(path, "w", buffering=1 << 20) as f:
+        if pretty is True:
+            json.dump(data, f, indent=4)
+        else:
+            json.dump(data, f, separators=(",", ":"))
+
+
+def read_json(path):
+    """Read data from a json file
+
+    Args:
+        path (str): json file path
+
+    Return:
+        deserialized data
+    """
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_source_mesh(mesh):
+    """Get a weight manager source mesh, cached inside query_cache()
+
+    Args:
+        mesh (str): mesh to load
+
+    Return:
+        core.SourceMesh: mesh loaded from selection
+    """
+    key = ("source_mesh", mesh)
+    if _QUERY_CACHE is not None and key in _QUERY_CACHE:
+        return _QUERY_CACHE[key]
+
+    with preserve_selection():
+        cmds.select(mesh, replace=True)
+        msh_obj = core.SourceMesh()
+        msh_obj.load_from_selection()
+
+    if _QUERY_CACHE is not None:
+        _QUERY_CACHE[key] = msh_obj
+    return msh_obj
+
+
 def export_deformers_weights(mesh, directory):
     deformers, types = list_deformers(mesh, types=["cluster", "ffd"])
     deformers = {x: {"channel": 0} for x in deformers}
     filepath = os.path.join(directory, f"{mesh}_deformerWeights.json")
 
     if deformers:
-        cmds.select(mesh)
-        msh_obj = core.SourceMesh()
-        msh_obj.load_from_selection()
+        msh_obj = get_source_mesh(mesh)
         core.export_weights(msh_obj, deformers, filepath)
 
 
@@ -493,9 +1026,7 @@ def import_deformers_weights(mesh, directory):
     filepath = os.path.join(directory, f"{mesh}_deformerWeights.json")
     correspondence = {deformer: deformer for deformer in deformers}
 
-    cmds.select(mesh)
-    msh_obj = core.SourceMesh()
-    msh_obj.load_from_selection()
+    msh_obj = get_source_mesh(mesh)
 
     try:
         core.import_weights(msh_obj, correspondence, filepath)
@@ -524,19 +1055,10 @@ def import_skinning_weights(mesh, directory):
 
 
 def get_clusters(cluster_group=GROUPS_HIERARCHY["clusters"]):
-    children = cmds.listRelatives(cluster_group, allDescendents=True)
-    clusters = []
-
-    for child in children:
-        typ = cmds.nodeType(child)
-        if typ != "clusterHandle":
-            continue
-        name = child
-        if "HandleShape" in child:
-            name = child.replace("HandleShape", "")
-        clusters.append(name)
+    children = cmds.listRelatives(cluster_group, allDescendents=True) or []
+    handles = cmds.ls(children, type="clusterHandle") if children else []
 
-    return clusters
+    return [handle.replace("HandleShape", "") for handle in handles or []]
 
 
 def build_cluster_plugs(cluster):
@@ -552,32 +1074,40 @@ def build_cluster_plugs(cluster):
 def connect_clusters_bpm(clusters=None):
     if not clusters:
         clusters = get_clusters()
-    for cluster in clusters:
-        input_plug, dest_plug = build_cluster_plugs(cluster)
-        try:
-            cmds.connectAttr(input_plug, dest_plug, force=True)
-        except:
-            LOG.info("Can't connect: %s -> %s", input_plug, dest_plug)
+
+    # Resolve every plug pair first, then connect them in one DG pause
+    plugs = [build_cluster_plugs(cluster) for cluster in clusters]
+    with batched_dg(undo=True), undo_chunk("connect_clusters_bpm"):
+        for input_plug, dest_plug in plugs:
+            try:
+                cmds.connectAttr(input_plug, dest_plug, force=True)
+            except:
+                LOG.info("Can't connect: %s -> %s", input_plug, dest_plug)
 
 
 def disconnect_clusters_bpm(clusters=None):
     if not clusters:
         clusters = get_clusters()
-    for cluster in clusters:
-        input_plug, dest_plug = build_cluster_plugs(cluster)
-        try:
-            cmds.disconnectAttr(input_plug, dest_plug)
-        except:
-            LOG.info("Can't disconnect: %s -> %s", input_plug, dest_plug)
+
+    # Resolve every plug pair first, then disconnect them in one DG pause
+    plugs = [build_cluster_plugs(cluster) for cluster in clusters]
+    with batched_dg(undo=True), undo_chunk("disconnect_clusters_bpm"):
+        for input_plug, dest_plug in plugs:
+            try:
+                cmds.disconnectAttr(input_plug, dest_plug)
+            except:
+                LOG.info("Can't disconnect: %s -> %s", input_plug, dest_plug)
 
 
 def get_attributes(obj, attributes="trs", axis="xyz"):
     attribute_list = []
     attribute_value_list = []
-    for attr in [x + y for x in attributes for y in axis]:
-        value = cmds.getAttr("{}.{}".format(obj, attr))
-        attribute_list.append(attr)
-        attribute_value_list.append(value)
+    for x in attributes:
+        # One query per compound, its children come in xyz order
+        values = dict(zip("xyz", cmds.getAttr("{}.{}".format(obj, x))[0]))
+        for y in axis:
+            attribute_list.append(x + y)
+            attribute_value_list.append(values[y])
 
     return attribute_list, attribute_value_list
 
@@ -598,9 +1128,12 @@ def mirror_obj(nodes, invert=True):
 
         if typ == "pointConstraint":
             attributes, values = get_attributes(obj, attributes="o")
-            for i, attr in enumerate(attributes):
-                new_value = -values[i] if "x" in attr else values[i]
-                cmds.setAttr("{}.{}".format(obj_other_side, attr), new_value)
+            cmds.setAttr(
+                "{}.o".format(obj_other_side),
+                -values[0],
+                values[1],
+                values[2],
+            )
 
         if typ == "transform":
             attributes, values = get_attributes(obj)
@@ -630,19 +1163,15 @@ def mirror_joints():
         "M_base_04_jnt_offset",
         "M_base_05_jnt_offset",
     ]
-    raw = []
-    for base in bases:
-        children = cmds.listRelatives(base, allDescendents=True)[::-1]
-        raw.extend(children)
-
-    nodes = []
-    for node in raw:
-        if "_offset" not in node:
-            continue
-        if "L_" not in node:
-            continue
-        nodes.append(node)
+    # A dag ls walks every hierarchy at once, parents before children
+    nodes = [
+        node
+        for node in cmds.ls(bases, dag=True)
+        if "_offset" in node and "L_" in node
+    ]
 
+    # Offsets share most of their parents, query each scale once
+    sx_cache = {}
     for obj in nodes:
         obj_other_side = obj.replace("L_", "R_")
 
@@ -651,7 +1180,10 @@ def mirror_joints():
         parents = fullpath.split("|")
         for parent in parents:
             if parent:
-                sx = cmds.getAttr(f"{parent}.sx")
+                sx = sx_cache.get(parent)
+                if sx is None:
+                    sx = cmds.getAttr(f"{parent}.sx")
+                    sx_cache[parent] = sx
                 if sx < 0:
                     invert = False
                     break
@@ -671,38 +1203,45 @@ def mirror_joints():
 
 
 def mirror_controllers():
-    controllers = cmds.ls("L_*_ctrl")
-    double_offsets = []
-    point_constraints = []
-
+    # Filter once up front, right sides are checked in a single ls
+    candidates = [
+        obj
+        for obj in cmds.ls("L_*_ctrl")
+        if not ("eye_" in obj and "cluster_" not in obj)
+    ]
+    rsides = {obj: obj.replace("L_", "R_") for obj in candidates}
+    existing = set(cmds.ls(list(rsides.values())) or []) if rsides else set()
+    controllers = [obj for obj in candidates if rsides[obj] in existing]
+
+    # Map each double offset to its point constraint from the DAG paths,
+    # resolved in one selection list. Shared offsets are visited once
+    double_offsets = {}
+    selection = om2.MSelectionList()
     for obj in controllers:
-        rside = obj.replace("L_", "R_")
-        if not cmds.objExists(rside):
-            controllers.remove(obj)
-            continue
-
-        if "eye_" in obj and "cluster_" not in obj:
-            controllers.remove(obj)
-            continue
-
         if "Twk" in obj or "twk" in obj:
             continue
+        selection.add(obj)
 
-        double_offset = cmds.listRelatives(
-            cmds.listRelatives(obj, parent=True), parent=True
-        )
-
-        if not double_offset:
+    for index in range(selection.length()):
+        dag_path = selection.getDagPath(index)
+        if dag_path.length() < 3:
+            continue
+        dag_path.pop(2)
+        # Unique partial paths, as listRelatives returns them
+        name = dag_path.partialPathName()
+        if name in double_offsets:
             continue
 
-        children = cmds.listRelatives(double_offset, children=True)
-        point_constraint = children[-1] if len(children) > 1 else None
-
-        double_offsets.append(double_offset[0])
-        if point_constraint:
-            point_constraints.append(point_constraint)
+        double_offsets[name] = None
+        double_offset = om2.MFnDagNode(dag_path)
+        child_count = double_offset.childCount()
+        if child_count > 1:
+            constraint_path = om2.MDagPath(dag_path)
+            constraint_path.push(double_offset.child(child_count - 1))
+            double_offsets[name] = constraint_path.partialPathName()
 
-    mirror_obj(double_offsets, invert=True)
+    point_constraints = [x for x in double_offsets.values() if x]
+    mirror_obj(list(double_offsets), invert=True)
     mirror_obj(point_constraints, invert=True)
 
     for obj in controllers:
@@ -717,12 +1256,19 @@ def mirror_controllers():
 
 
 def mirror_cvs(cvs, mode="x", replaces=("LR")):
-    for cv in cvs:
-        pos = cmds.xform(cv, q=1, ws=1, t=1)
-        cv_side = cv.replace(replaces[0], replaces[1])
-        if not cmds.objExists(cv_side):
+    if not cvs:
+        return
+
+    # Query every position and check every other side cv in one call each
+    cvs_side = [cv.replace(replaces[0], replaces[1]) for cv in cvs]
+    existing = set(cmds.ls(cvs_side, flatten=True) or [])
+    positions = cmds.xform(cvs, q=1, ws=1, t=1)
+
+    for i, cv_side in enumerate(cvs_side):
+        if cv_side not in existing:
             continue
 
+        pos = positions[i * 3 : i * 3 + 3]
         if mode == "x":
             cmds.xform(cv_side, ws=1, t=[pos[0] * (-1), pos[1], pos[2]])
         if mode == "z":
@@ -777,36 +1323,47 @@ def make_edges_rivet(edges, input_mesh_plug, name="mouth"):
     cmds.setAttr(f"{posi}.turnOnPercentage", 1)
     cmds.setAttr(f"{vector}.operation", 2)
 
-    # Connect nodes
+    # Add message attributes
+    attr_name = "rivetLink"
+    for crvfe in crvfe_nodes:
+        if not cmds.attributeQuery(attr_name, node=crvfe, exists=True):
+            cmds.addAttr(crvfe, longName=attr_name, dataType="string")
+        cmds.setAttr(
+            f"{crvfe}.{attr_name}", node_names["rivet"], type="string"
+        )
+
+    # Connect nodes, connections are queued and made in one transaction
+    connections = []
     for i, crvfe in enumerate(crvfe_nodes):
-        cmds.connectAttr(input_mesh_plug, f"{crvfe}.inputMesh")
-        cmds.connectAttr(f"{crvfe}.outputCurve", f"{loft}.inputCurve[{i}]")
+        connections.append((input_mesh_plug, f"{crvfe}.inputMesh"))
+        connections.append(
+            (f"{crvfe}.outputCurve", f"{loft}.inputCurve[{i}]")
+        )
 
-    cmds.connectAttr(f"{loft}.outputSurface", f"{posi}.inputSurface")
+    connections.append((f"{loft}.outputSurface", f"{posi}.inputSurface"))
 
     attributes = ["p", "n", "tv"]
     indices = "301"
     for y, (attr, row) in enumerate(zip(attributes, indices)):
         for i, axis in enumerate("xyz"):
-            cmds.connectAttr(f"{posi}.{attr}{axis}", f"{fbfmx}.i{row}{i}")
+            connections.append((f"{posi}.{attr}{axis}", f"{fbfmx}.i{row}{i}"))
             if y == 0:
-                cmds.connectAttr(f"{vector}.o{axis}", f"{fbfmx}.i2{i}")
+                connections.append((f"{vector}.o{axis}", f"{fbfmx}.i2{i}"))
                 continue
-            cmds.connectAttr(f"{posi}.{attr}{axis}", f"{vector}.i{y}{axis}")
+            connections.append(
+                (f"{posi}.{attr}{axis}", f"{vector}.i{y}{axis}")
+            )
 
-    cmds.connectAttr(f"{fbfmx}.output", f"{rivet}.offsetParentMatrix")
+    connections.append((f"{fbfmx}.output", f"{rivet}.offsetParentMatrix"))
 
     # Add message connections
     for crvfe in crvfe_nodes:
-        attr_name = "rivetLink"
-        if not cmds.attributeQuery(attr_name, node=crvfe, exists=True):
-            cmds.addAttr(crvfe, longName=attr_name, dataType="string")
-        cmds.setAttr(
-            f"{crvfe}.{attr_name}", node_names["rivet"], type="string"
-        )
-        cmds.connectAttr(
-            f"{rivet}.message", f"{crvfe}.{attr_name}", force=True
-        )
+        connections.append((f"{rivet}.message", f"{crvfe}.{attr_name}"))
+
+    modifier = om2.MDGModifier()
+    for source, destination in connections:
+        connect_plugs(modifier, get_plug(source), get_plug(destination))
+    modifier.doIt()
 
     # Add indentifier attribute
     id_name = f"{name}_rivet"
@@ -823,8 +1380,8 @@ def set_edges_rivet(edges, rivet):
         f"{rivet}.message", type="curveFromMeshEdge"
     )
     for node, edge in zip(crvfe_nodes, edges):
-        match = re.search(r"\[(\d+)\]", edge)
-        number = int(match.group(1))
+        # Edges are given as "mesh.e[index]"
+        number = int(edge[edge.rindex("[") + 1 : edge.rindex("]")])
         cmds.setAttr(f"{node}.edgeIndex[0]", number)
 
 
@@ -837,8 +1394,7 @@ def export_controllers_to_json():
     output_path = os.path.splitext(scene_path)[0] + "_data.json"
     controllers = cmds.ls("*_ctrl")
 
-    with open(output_path, "w") as json_file:
-        json.dump(controllers, json_file, indent=4)
+    write_json(output_path, controllers, pretty=True)
 
     cmds.confirmDialog(
         title="Export Complete",
@@ -853,16 +1409,21 @@ def check_controllers_match():
         cmds.error(f"{json_path} not found.", noContext=True)
         return
 
-    with open(json_path) as json_file:
-        reference_controllers = json.load(json_file)
+    reference_controllers = read_json(json_path)
 
     controllers = cmds.ls("*_ctrl")
     current_controllers = [
-        ctrl for ctrl in controllers if ctrl not in SKIP_CONTROLLERS
+        ctrl for ctrl in controllers if ctrl not in _SKIP_CONTROLLERS
     ]
 
+    # Check every reference controller in a single ls
+    existing = (
+        set(cmds.ls(reference_controllers) or [])
+        if reference_controllers
+        else set()
+    )
     non_matching = [
-        ctrl for ctrl in reference_controllers if not cmds.objExists(ctrl)
+        ctrl for ctrl in reference_controllers if ctrl not in existing
     ]
 
     print("\n\n")
@@ -933,34 +1494,35 @@ def rebuild_blendshape_target(blendshape, index):
 
 
 def ctrl_lips_mirror():
-    for mod in ["upper", "lower"]:
-        cmds.connectAttr(
-            f"lips_{mod}_depth_plusMinusAverage.output3Dz",
-            f"R_lip_{mod}_main_jnt.translateZ",
-            force=True,
-        )
+    with batched_dg(undo=True), undo_chunk("ctrl_lips_mirror"):
+        for mod in ["upper", "lower"]:
+            cmds.connectAttr(
+                f"lips_{mod}_depth_plusMinusAverage.output3Dz",
+                f"R_lip_{mod}_main_jnt.translateZ",
+                force=True,
+            )
 
 
 def create_lips_shapes():
     animation.reset_ctrls()
-    ctrls = ["M_lip_{mod}_global_ctrl", "M_lip_{mod}_main_ctrl"]
     for mod in ["upper", "lower"]:
-        ctrl0 = ctrls[0].format(mod=mod)
-        ctrl1 = ctrls[1].format(mod=mod)
+        # Resolve the plugs once, the poses only change their values
+        plug0 = get_plug(f"M_lip_{mod}_global_ctrl.translateY")
+        plug1 = get_plug(f"M_lip_{mod}_main_ctrl.translateY")
 
         for value in [1, -1]:
-            cmds.setAttr(f"{ctrl0}.translateY", 1 * value)
-            cmds.setAttr(f"{ctrl1}.translateY", 0.75 * -value)
+            set_plug_value(plug0, 1 * value)
+            set_plug_value(plug1, 0.75 * -value)
 
-            dup = cmds.duplicate("M_body_bs_mesh")[0]
-            cmds.parent(dup, world=True)
+            copy_mesh("M_body_bs_mesh")
 
-            cmds.setAttr(f"{ctrl0}.translateY", 0)
-            cmds.setAttr(f"{ctrl1}.translateY", 0)
+            set_plug_value(plug0, 0)
+            set_plug_value(plug1, 0)
 
-    cmds.setAttr("M_lip_upper_global_ctrl.techMidLipDefaultRatio", lock=False)
-    cmds.setAttr("M_lip_upper_global_ctrl.techMidLipDefaultRatio", 0.75)
-    cmds.setAttr("M_lip_upper_global_ctrl.techMidLipDefaultRatio", lock=True)
+    # set_plug_value unlocks the plug for the edit then locks it back
+    set_plug_value(
+        get_plug("M_lip_upper_global_ctrl.techMidLipDefaultRatio"), 0.75
+    )
 
 
 def match_pivot(cancel=False):
@@ -970,42 +1532,45 @@ def match_pivot(cancel=False):
     if not cancel:
         obj1, obj2 = sel
 
-        obj1_pivot = cmds.xform(
-            obj1, query=True, worldSpace=True, rotatePivot=True
+        selection = om2.MSelectionList()
+        selection.add(obj1)
+        selection.add(obj2)
+        obj1_pivot = om2.MFnTransform(selection.getDagPath(0)).rotatePivot(
+            om2.MSpace.kWorld
         )
-        obj2_pivot = cmds.xform(
-            obj2, query=True, worldSpace=True, rotatePivot=True
+        obj2_pivot = om2.MFnTransform(selection.getDagPath(1)).rotatePivot(
+            om2.MSpace.kWorld
         )
 
-        offset = [obj2_pivot[i] - obj1_pivot[i] for i in range(3)]
-        current_offset = cmds.getAttr(f"{obj1}.offset")[0]
-        new_offset = [current_offset[i] + offset[i] for i in range(3)]
-
-        cmds.setAttr(
-            f"{obj1}.offset", new_offset[0], new_offset[1], new_offset[2]
+        # Kept as a vector so the cancel branch reuses it as is, the API
+        # gives internal units while setAttr and move take UI units
+        delta = obj2_pivot - obj1_pivot
+        offset = om2.MVector(
+            om2.MDistance.internalToUI(delta.x),
+            om2.MDistance.internalToUI(delta.y),
+            om2.MDistance.internalToUI(delta.z),
+        )
+        current_offset = om2.MVector(cmds.getAttr(f"{obj1}.offset")[0])
+        new_offset = current_offset + offset
+
+        cmds.setAttr(f"{obj1}.offset", *new_offset)
+
+        match = _CTRL_NAME_RE.match(obj1)
+        controller = match.group(0) if match else obj1
+
+        # Every CV gets the same offset, move them all at once
+        cmds.move(
+            -offset.x,
+            -offset.y,
+            -offset.z,
+            f"{controller}.cv[*]",
+            relative=True,
+            worldSpace=True,
         )
-
-        parts = obj1.split("_")
-        ctrl_name = []
-        for part in parts:
-            ctrl_name.append(part)
-            if "ctrl" in part:
-                break
-        controller = "_".join(ctrl_name)
-
-        cvs = cmds.ls(f"{controller}.cv[*]", flatten=True)
-        for cv in cvs:
-            pos = cmds.pointPosition(cv, world=True)
-            new_pos = [pos[i] - offset[i] for i in range(3)]
-            cmds.xform(cv, worldSpace=True, translation=new_pos)
 
     else:
         for obj in sel:
-            current_offset = cmds.getAttr(f"{obj}.offset")[0]
-            new_offset = [current_offset[i] - offset[i] for i in range(3)]
-            cmds.setAttr(
-                f"{obj}.offset",
-                new_offset[0],
-                new_offset[1],
-                new_offset[2],
-            )
+            # Subtract in place, no temporary vector per object
+            new_offset = om2.MVector(cmds.getAttr(f"{obj}.offset")[0])
+            new_offset -= offset
+            cmds.setAttr(f"{obj}.offset", *new_offset)
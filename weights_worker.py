@@ -0,0 +1,36 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# Entry points of the mayapy weights export workers. Only import the
+# standard library at module level: maya.standalone has to be initialized
+# before maya.cmds or any module using it is imported.
+
+
+def init_worker(scene_path):
+    """Initialize maya.standalone and open the scene to export
+
+    Args:
+        scene_path (str): scene exported by the main Maya session
+    """
+    import maya.standalone
+
+    maya.standalone.initialize()
+
+    import maya.cmds as cmds
+
+    cmds.file(scene_path, open=True, force=True)
+
+
+def export_mesh_weights(mesh, directory):
+    """Export the deformers and skinning weights of a mesh
+
+    Args:
+        mesh (str): mesh to export
+        directory (str): where to export weights files
+    """
+    from lfdn_td.facial import utils
+
+    with utils.query_cache():
+        utils.export_deformers_weights(mesh, directory)
+        utils.export_skinning_weights(mesh, directory)